@@ -1,14 +1,46 @@
 import argparse
+import bisect
 import datetime
 import json
-import statistics
+import os
+import re
 import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Any, Optional
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json decoder
+    orjson = None
 
-def get_tvl_dataset(protocol: str, start_date: str, end_date: str, extrapolate: bool = False, by_chain: bool = True) -> list[dict[str, Any]]:
+# Number of boundary data points used to estimate the extrapolation slope; with more than
+# two, the slope is a least-squares fit through them
+_EXTRAPOLATION_POINTS = 2
+
+# Ordinal of the UNIX epoch (1970-01-01), for converting timestamps to day ordinals
+_EPOCH_ORD = datetime.date(1970, 1, 1).toordinal()
+
+# chainTvls keys that are not plain chains: bare category names and "<chain>-<category>"
+_EXCLUDED_CHAIN_NAMES = frozenset({"borrowed", "staking", "pool2"})
+_EXCLUDED_CHAIN_SUFFIX = re.compile(r"-(?:borrowed|staking|pool2)")
+
+
+def get_tvl_dataset(
+    protocol: str,
+    start_date: str,
+    end_date: str,
+    extrapolate: bool = False,
+    by_chain: bool = True,
+    max_gap_days: Optional[int] = None,
+) -> list[dict[str, Any]]:
     """
     Fetch the complete daily TVL dataset for a given protocol between start_date and end_date.
     Missing values are linearly interpolated between available data points.
@@ -20,12 +52,17 @@ def get_tvl_dataset(protocol: str, start_date: str, end_date: str, extrapolate:
     - If extrapolate=True: Uses linear extrapolation based on the two nearest 
       data points on that side to estimate the TVL value.
 
+    If max_gap_days is set, dates inside a gap between data points spanning more than
+    max_gap_days days are not interpolated and have None for tvl_interpolated.
+
     Parameters:
     - protocol (str): The protocol name (as listed on DeFiLlama).
     - start_date (str): Start date in YYYY-MM-DD format (UTC).
     - end_date (str): End date in YYYY-MM-DD format (UTC).
     - extrapolate (bool): Whether to extrapolate values at start/end. Default: False.
     - by_chain (bool): Whether to break down TVL by chain. Default: True.
+    - max_gap_days (int|None): Largest gap (in days) to interpolate across. Default: None
+      (no limit).
 
     Returns:
     - If by_chain=False: List of dictionaries with keys:
@@ -41,166 +78,393 @@ def get_tvl_dataset(protocol: str, start_date: str, end_date: str, extrapolate:
       - 'total_interpolated' (float|None): Sum of all chain interpolated values
     """
     # Convert input dates to date objects
-    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    start_dt = datetime.date.fromisoformat(start_date)
+    end_dt = datetime.date.fromisoformat(end_date)
 
-    # Fetch historical TVL data from DeFiLlama
-    url = f"https://api.llama.fi/protocol/{protocol}"
-    response = requests.get(url)
+    # Fetch historical TVL data from DeFiLlama (cached per protocol)
+    data = _fetch_protocol_tvl(protocol)
 
-    if response.status_code != 200:
-        raise ValueError(f"Error fetching data: {response.status_code}")
+    return _build_tvl_dataset(protocol, data, start_dt, end_dt, extrapolate, by_chain, max_gap_days)
 
-    data = response.json()
 
+def _build_tvl_dataset(
+    protocol: str,
+    data: dict[str, Any],
+    start_dt: datetime.date,
+    end_dt: datetime.date,
+    extrapolate: bool,
+    by_chain: bool,
+    max_gap_days: Optional[int] = None,
+) -> list[dict[str, Any]]:
+    """
+    Build the daily TVL dataset from an already-fetched DeFiLlama payload.
+
+    See get_tvl_dataset for the meaning of the parameters and the returned rows.
+    """
     if by_chain:
-        return _get_tvl_dataset_by_chain(data, start_dt, end_dt, extrapolate)
+        return _get_tvl_dataset_by_chain(data, start_dt, end_dt, extrapolate, max_gap_days)
+
+    return _get_tvl_columns(
+        protocol, data, start_dt, end_dt, extrapolate, max_gap_days
+    ).to_records()
+
+
+@dataclass(frozen=True)
+class _TVLResult:
+    """
+    Aggregate daily TVL series in columnar form, one entry per day in the range.
+
+    Attributes:
+    - dates: ISO date strings (YYYY-MM-DD)
+    - raw: Raw TVL per day, NaN where no data point exists
+    - interpolated: Interpolated/extrapolated TVL per day, NaN where none can be computed
+    - int_days: Days whose value is a data point the API gave as an int
+    """
 
+    dates: list[str]
+    raw: np.ndarray
+    interpolated: np.ndarray
+    int_days: np.ndarray
+
+    def to_records(self) -> list[dict[str, Any]]:
+        """Materialize the public row format, with None in place of NaN."""
+        return [
+            {"date": date, "tvl_raw": raw_tvl, "tvl_interpolated": interp_tvl}
+            for date, raw_tvl, interp_tvl in zip(
+                self.dates,
+                _nan_to_none(self.raw, self.int_days),
+                _nan_to_none(self.interpolated, self.int_days),
+            )
+        ]
+
+
+def _get_tvl_columns(
+    protocol: str,
+    data: dict[str, Any],
+    start_dt: datetime.date,
+    end_dt: datetime.date,
+    extrapolate: bool,
+    max_gap_days: Optional[int] = None,
+) -> _TVLResult:
+    """
+    Compute the aggregate daily TVL series as parallel columns.
+
+    Returns:
+    - _TVLResult with one entry per day in the range
+    """
     tvl_data = data.get("tvl", [])
 
     if not tvl_data:
         raise ValueError(f"No TVL data found for protocol {protocol}")
 
-    # Build a map of date -> TVL (convert UNIX seconds to a UTC date to avoid local-TZ skew)
-    tvl_map = {
-        datetime.datetime.fromtimestamp(entry["date"], tz=datetime.timezone.utc).date(): entry[
-            "totalLiquidityUSD"
-        ]
-        for entry in tvl_data
-    }
-
-    # Get sorted list of all available dates (for interpolation, we need dates outside range too)
-    all_available_dates = sorted(tvl_map.keys())
-
-    # Get dates within the range to check if we have any data
-    available_dates_in_range = [d for d in all_available_dates if start_dt <= d <= end_dt]
-
-    if not available_dates_in_range:
-        raise ValueError(f"No TVL data available between {start_date} and {end_date}")
-
-    # Build the result dataset with interpolation
-    result = []
-    current_date = start_dt
-
-    while current_date <= end_dt:
-        if current_date in tvl_map:
-            # Raw data exists
-            raw_tvl = tvl_map[current_date]
-            result.append(
-                {
-                    "date": current_date.isoformat(),
-                    "tvl_raw": raw_tvl,
-                    "tvl_interpolated": raw_tvl,  # When raw exists, interpolated equals raw
-                }
-            )
-        else:
-            # Need to interpolate, extrapolate, or return None
-            prev_date, next_date = _find_nearest_dates(current_date, all_available_dates)
-
-            if prev_date is not None and next_date is not None:
-                # Linear interpolation between two points
-                prev_tvl = tvl_map[prev_date]
-                next_tvl = tvl_map[next_date]
-
-                # Calculate days between points
-                days_between = (next_date - prev_date).days
-                days_from_prev = (current_date - prev_date).days
-
-                # Linear interpolation
-                interpolated_tvl = prev_tvl + (next_tvl - prev_tvl) * (
-                    days_from_prev / days_between
-                )
-
-                result.append(
-                    {
-                        "date": current_date.isoformat(),
-                        "tvl_raw": None,
-                        "tvl_interpolated": interpolated_tvl,
-                    }
-                )
-            elif not extrapolate:
-                # No extrapolation: include date with None values
-                result.append(
-                    {
-                        "date": current_date.isoformat(),
-                        "tvl_raw": None,
-                        "tvl_interpolated": None,
-                    }
-                )
-            elif prev_date is not None:
-                # Only previous data exists - extrapolate forward using trend from two most recent points
-                # Find the two most recent data points before or at current_date
-                dates_before = [d for d in all_available_dates if d <= current_date or d == prev_date]
-                if len(dates_before) >= 2:
-                    # Use the two most recent points to calculate slope
-                    date1 = dates_before[-2]
-                    date2 = dates_before[-1]
-                    tvl1 = tvl_map[date1]
-                    tvl2 = tvl_map[date2]
-                    slope = _get_extrapolation_slope(date1, tvl1, date2, tvl2)
-                    
-                    # Extrapolate from the most recent point
-                    days_diff = (current_date - date2).days
-                    extrapolated_tvl = tvl2 + slope * days_diff
-                    
-                    result.append(
-                        {
-                            "date": current_date.isoformat(),
-                            "tvl_raw": None,
-                            "tvl_interpolated": extrapolated_tvl,
-                        }
-                    )
-                else:
-                    # Only one data point available, use it directly (fallback)
-                    result.append(
-                        {
-                            "date": current_date.isoformat(),
-                            "tvl_raw": None,
-                            "tvl_interpolated": tvl_map[prev_date],
-                        }
-                    )
-            elif next_date is not None:
-                # Only future data exists - extrapolate backward using trend from two earliest points
-                # Find the two earliest data points after or at current_date
-                dates_after = [d for d in all_available_dates if d >= current_date or d == next_date]
-                if len(dates_after) >= 2:
-                    # Use the two earliest points to calculate slope
-                    date1 = dates_after[0]
-                    date2 = dates_after[1]
-                    tvl1 = tvl_map[date1]
-                    tvl2 = tvl_map[date2]
-                    slope = _get_extrapolation_slope(date1, tvl1, date2, tvl2)
-                    
-                    # Extrapolate backward from the earliest point
-                    days_diff = (current_date - date1).days  # This will be negative
-                    extrapolated_tvl = tvl1 + slope * days_diff
-                    
-                    result.append(
-                        {
-                            "date": current_date.isoformat(),
-                            "tvl_raw": None,
-                            "tvl_interpolated": extrapolated_tvl,
-                        }
-                    )
-                else:
-                    # Only one data point available, use it directly (fallback)
-                    result.append(
-                        {
-                            "date": current_date.isoformat(),
-                            "tvl_raw": None,
-                            "tvl_interpolated": tvl_map[next_date],
-                        }
-                    )
-            else:
-                # No data available at all (shouldn't happen if we have data in range)
-                if extrapolate:
-                    result.append(
-                        {"date": current_date.isoformat(), "tvl_raw": None, "tvl_interpolated": 0.0}
-                    )
+    # Parse timestamps and values in one pass; UNIX seconds map to UTC day ordinals directly
+    timestamps = np.fromiter((entry["date"] for entry in tvl_data), dtype=np.int64)
+    values = np.fromiter((entry["totalLiquidityUSD"] for entry in tvl_data), dtype=np.float64)
+    is_int = np.fromiter(
+        (type(entry["totalLiquidityUSD"]) is int for entry in tvl_data), dtype=bool
+    )
+    day_ords = timestamps // 86400 + _EPOCH_ORD
+
+    start_ord = start_dt.toordinal()
+    end_ord = end_dt.toordinal()
+
+    if np.all(day_ords[1:] >= day_ords[:-1]):
+        # Sorted history (the API contract): keep the last entry of each day in one pass, then
+        # binary-search the requested range by distinct day, keeping enough neighbouring days
+        # on each side for interpolation and extrapolation anchors
+        is_last = np.append(day_ords[1:] != day_ords[:-1], True)
+        xp = day_ords[is_last]
+        fp = values[is_last]
+        is_int = is_int[is_last]
+        lo = int(np.searchsorted(xp, start_ord, side="left"))
+        hi = int(np.searchsorted(xp, end_ord, side="right"))
+        has_data_in_range = hi > lo
+        window = slice(max(lo - _EXTRAPOLATION_POINTS, 0), hi + _EXTRAPOLATION_POINTS)
+        xp = xp[window]
+        fp = fp[window]
+        is_int = is_int[window]
+    else:
+        has_data_in_range = bool(np.any((day_ords >= start_ord) & (day_ords <= end_ord)))
+        # Unique sorted days with their TVL (later entries for the same day win, so
+        # deduplicate the reversed arrays, where np.unique keeps the first occurrence)
+        xp, last_idx = np.unique(day_ords[::-1], return_index=True)
+        fp = values[::-1][last_idx]
+        is_int = is_int[::-1][last_idx]
+
+    if not has_data_in_range:
+        raise ValueError(
+            f"No TVL data available between {start_dt.isoformat()} and {end_dt.isoformat()}"
+        )
+
+    days = np.arange(start_ord, end_ord + 1)
+    raws, interps = _interpolate_series(xp, fp, days, extrapolate, max_gap_days)
+
+    int_days = _int_sourced_days(xp, is_int, days, extrapolate)
+    return _TVLResult(_iso_dates(days), raws, interps, int_days)
+
+
+def _interpolate_series(
+    xp: np.ndarray,
+    fp: np.ndarray,
+    days: np.ndarray,
+    extrapolate: bool,
+    max_gap_days: Optional[int] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate a TVL series on a grid of days, using NaN where no value can be computed.
 
-        current_date += datetime.timedelta(days=1)
+    A single binary search gives every target day the index of the last known day on or
+    before it, which drives raw lookup, interpolation and the gap limit without branching.
 
-    return result
+    Parameters:
+    - xp: Sorted, unique day ordinals with data
+    - fp: TVL values for xp
+    - days: Consecutive day ordinals to evaluate
+    - extrapolate: Whether to extrapolate before the first and after the last known day
+    - max_gap_days: Largest gap to interpolate across, or None for no limit
+
+    Returns:
+    - Tuple of (tvl_raw, tvl_interpolated) float64 arrays aligned with days
+
+    Raises:
+    - ValueError: If max_gap_days is less than 1
+    """
+    if max_gap_days is not None and max_gap_days < 1:
+        raise ValueError(f"max_gap_days must be at least 1, got {max_gap_days}")
+
+    # Dense fast path: every requested day has a data point, so both columns are a slice of fp
+    n = days.size
+    first = int(np.searchsorted(xp, days[0])) if n else 0
+    if n and first + n <= xp.size and xp[first] == days[0] and xp[first + n - 1] == days[-1]:
+        raws = fp[first : first + n].astype(np.float64, copy=True)
+        return raws, raws.copy()
+
+    last = xp.size - 1
+    prev = np.searchsorted(xp, days, side="right") - 1
+    prev_clipped = np.maximum(prev, 0)
+
+    # Raw column: NaN except on days with a data point
+    is_raw = (prev >= 0) & (xp[prev_clipped] == days)
+    raws = np.where(is_raw, fp[prev_clipped], np.nan)
+    interps = raws.copy()
+
+    # Interior gaps: linear interpolation between the neighbouring known days
+    interior = (prev >= 0) & (prev < last) & ~is_raw
+    lo = prev[interior]
+    x0, x1 = xp[lo], xp[lo + 1]
+    y0, y1 = fp[lo], fp[lo + 1]
+    filled = y0 + (y1 - y0) * ((days[interior] - x0) / (x1 - x0))
+    if max_gap_days is not None:
+        # Gaps too wide to interpolate across reliably stay NaN
+        filled[(x1 - x0) > max_gap_days] = np.nan
+    interps[interior] = filled
+
+    if extrapolate:
+        after = (prev == last) & ~is_raw
+        if after.any():
+            # Extrapolate forward using the trend from the most recent points
+            slope = _fit_slope(xp[-_EXTRAPOLATION_POINTS:], fp[-_EXTRAPOLATION_POINTS:])
+            interps[after] = fp[-1] + slope * (days[after] - xp[-1])
+
+        before = prev < 0
+        if before.any():
+            # Extrapolate backward from the earliest points (day offset is negative)
+            slope = _fit_slope(xp[:_EXTRAPOLATION_POINTS], fp[:_EXTRAPOLATION_POINTS])
+            interps[before] = fp[0] + slope * (days[before] - xp[0])
+
+    return raws, interps
+
+
+def _int_sourced_days(
+    xp: np.ndarray, is_int: np.ndarray, days: np.ndarray, extrapolate: bool
+) -> np.ndarray:
+    """
+    Mark the days whose value is copied unchanged from a data point the API gave as an int.
+
+    The float64 columns lose the int/float distinction of the JSON input; these days are
+    cast back to int at output. A single data point is extrapolated flat, so it marks
+    every day.
+    """
+    if extrapolate and xp.size == 1:
+        return np.full(days.size, bool(is_int[0]))
+    idx = np.minimum(np.searchsorted(xp, days), xp.size - 1)
+    return (xp[idx] == days) & is_int[idx]
+
+
+def _iso_dates(day_ords: np.ndarray) -> list[str]:
+    """Format day ordinals as YYYY-MM-DD strings in one vectorized cast."""
+    return (day_ords - _EPOCH_ORD).astype("datetime64[D]").astype(str).tolist()
+
+
+def _nan_to_none(
+    values: np.ndarray, int_days: Optional[np.ndarray] = None
+) -> list[Optional[float]]:
+    """Convert a float array to a list, replacing NaN with None and casting int_days to int."""
+    out = values.tolist()
+    if int_days is not None:
+        for j in np.flatnonzero(int_days & ~np.isnan(values)).tolist():
+            out[j] = int(out[j])
+    return [None if v != v else v for v in out]
+
+
+# Concurrent downloads in get_average_tvls; also the size of its session's connection pool,
+# so every worker can hold a keep-alive connection
+_FETCH_WORKERS = 8
+
+# In-process payload cache for _fetch_protocol_tvl, keyed by protocol, least recently used first
+_TVL_CACHE_SIZE = 128
+_tvl_payloads: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+_tvl_payloads_lock = threading.Lock()
+
+
+def _fetch_protocol_tvl(
+    protocol: str, session: Optional[requests.Session] = None
+) -> dict[str, Any]:
+    """
+    Fetch the full protocol payload from DeFiLlama.
+
+    Results are memoized in-process, keyed by protocol only, so every caller shares them
+    whichever session fetched them. If the TRR_CACHE_DIR environment variable is set,
+    payloads are also stored on disk, keyed by protocol and the current UTC day, so repeated
+    CLI invocations on the same day skip the network.
+
+    Parameters:
+    - protocol (str): The protocol name (as listed on DeFiLlama).
+    - session (requests.Session|None): Session to download through on a cache miss.
+      Default: requests.get.
+
+    Returns:
+    - The decoded JSON response.
+    """
+    with _tvl_payloads_lock:
+        data = _tvl_payloads.get(protocol)
+        if data is not None:
+            _tvl_payloads.move_to_end(protocol)
+            return data
+
+    data = _load_protocol_tvl(protocol, session)
+
+    with _tvl_payloads_lock:
+        _tvl_payloads[protocol] = data
+        if len(_tvl_payloads) > _TVL_CACHE_SIZE:
+            _tvl_payloads.popitem(last=False)
+    return data
+
+
+def _load_protocol_tvl(protocol: str, session: Optional[requests.Session] = None) -> dict[str, Any]:
+    """
+    Read the protocol payload from the disk cache, or download it and store it there.
+
+    Parameters:
+    - protocol (str): The protocol name (as listed on DeFiLlama).
+    - session (requests.Session|None): Session to download through. Default: requests.get.
+
+    Returns:
+    - The decoded JSON response.
+    """
+    cache_path = _tvl_cache_path(protocol)
+    if cache_path is not None:
+        cached = _load_cached_tvl(cache_path)
+        if cached is not None:
+            return cached
+
+    data = _download_protocol_tvl(protocol, session)
+
+    if cache_path is not None:
+        _save_cached_tvl(cache_path, data)
+
+    return data
+
+
+def _download_protocol_tvl(
+    protocol: str, session: Optional[requests.Session] = None
+) -> dict[str, Any]:
+    """
+    Request the protocol payload from DeFiLlama, without any caching.
+
+    Parameters:
+    - protocol (str): The protocol name (as listed on DeFiLlama).
+    - session (requests.Session|None): Session to reuse for keep-alive. Default: requests.get.
+
+    Returns:
+    - The decoded JSON response.
+    """
+    url = f"https://api.llama.fi/protocol/{protocol}"
+    http_get = session.get if session is not None else requests.get
+    response = http_get(url)
+
+    if response.status_code != 200:
+        raise ValueError(f"Error fetching data: {response.status_code}")
+
+    # Decode the raw body with orjson when possible; anything without bytes content
+    # (e.g. a stubbed response) goes through its own json()
+    content = getattr(response, "content", None)
+    if orjson is not None and isinstance(content, bytes):
+        return orjson.loads(content)
+    return response.json()
+
+
+def _tvl_cache_path(protocol: str) -> Optional[str]:
+    """Return the on-disk cache file for a protocol's payload today, or None if disabled."""
+    cache_dir = os.environ.get("TRR_CACHE_DIR")
+    if not cache_dir:
+        return None
+
+    today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    safe_protocol = re.sub(r"[^\w.-]", "_", protocol)
+    return os.path.join(os.path.expanduser(cache_dir), f"tvl_{safe_protocol}_{today}.json")
+
+
+def _load_cached_tvl(cache_path: str) -> Optional[dict[str, Any]]:
+    """Read a cached payload, or return None if it is missing or unreadable."""
+    try:
+        with open(cache_path) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except (OSError, ValueError):
+        # Missing or unreadable file, bad encoding or bad JSON: fall back to the network
+        return None
+
+
+def _save_cached_tvl(cache_path: str, data: dict[str, Any]) -> None:
+    """
+    Write a payload to the cache atomically and drop the protocol's older-day files.
+
+    The payload goes to a unique temp file in the cache directory first, so concurrent
+    writers of the same protocol never share a partial file. Failures only print a warning.
+    """
+    cache_dir, name = os.path.split(cache_path)
+    tmp = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=cache_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        print(f"Warning: could not write TVL cache {cache_path}: {e}", file=sys.stderr)
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+        return
+
+    _evict_stale_tvl(cache_dir, name)
+
+
+def _evict_stale_tvl(cache_dir: str, current_name: str) -> None:
+    """Delete cache files for the same protocol from other days than current_name."""
+    prefix = current_name[: -len("_YYYY-MM-DD.json")]
+    stale = re.compile(re.escape(prefix) + r"_\d{4}-\d{2}-\d{2}\.json")
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for other in names:
+        if other != current_name and stale.fullmatch(other):
+            try:
+                os.unlink(os.path.join(cache_dir, other))
+            except OSError:
+                # Already removed by another worker, or not ours to delete
+                pass
 
 
 def _find_nearest_dates(
@@ -208,22 +472,13 @@ def _find_nearest_dates(
 ) -> tuple[Optional[datetime.date], Optional[datetime.date]]:
     """
     Find the nearest previous and next available dates for interpolation.
+    available_dates must be sorted in ascending order.
     Returns (prev_date, next_date) tuple. Either can be None if not found.
     """
-    prev_date = None
-    next_date = None
-
-    # Find previous date (before or equal to target)
-    for date in reversed(available_dates):
-        if date <= target_date:
-            prev_date = date
-            break
-
-    # Find next date (after target)
-    for date in available_dates:
-        if date > target_date:
-            next_date = date
-            break
+    # Binary search: everything before i is <= target (previous), available_dates[i] is after
+    i = bisect.bisect_right(available_dates, target_date)
+    prev_date = available_dates[i - 1] if i > 0 else None
+    next_date = available_dates[i] if i < len(available_dates) else None
 
     return (prev_date, next_date)
 
@@ -233,79 +488,45 @@ def _get_extrapolation_slope(
 ) -> float:
     """
     Calculate the slope (TVL change per day) between two data points.
-    
+
     Parameters:
     - date1, date2: Two dates with known TVL values
     - tvl1, tvl2: The TVL values at those dates
-    
+
     Returns:
     - Slope as TVL change per day
     """
     days_between = (date2 - date1).days
-    if days_between == 0:
-        return 0.0
-    return (tvl2 - tvl1) / days_between
+    # Branchless zero-day guard: divide by 1 instead of 0, then zero the result
+    return (tvl2 - tvl1) / (days_between + (days_between == 0)) * (days_between != 0)
 
 
-def _process_tvl_series(
-    tvl_map: dict[datetime.date, float],
-    current_date: datetime.date,
-    all_available_dates: list[datetime.date],
-    extrapolate: bool,
-) -> tuple[Optional[float], Optional[float]]:
+def _fit_slope(ords: np.ndarray, tvls: np.ndarray) -> float:
     """
-    Process a single date for a TVL series, returning (raw, interpolated) values.
-    
+    Slope (TVL change per day) through anchor points given as day ordinals.
+
+    Two points use the exact difference quotient; more points use a closed-form
+    least-squares line fit (covariance over variance), in one vectorized pass.
+
     Parameters:
-    - tvl_map: Mapping of dates to TVL values
-    - current_date: The date to process
-    - all_available_dates: Sorted list of all dates with data
-    - extrapolate: Whether to extrapolate at edges
-    
+    - ords: Sorted day ordinals with known TVL values
+    - tvls: The TVL values at those days
+
     Returns:
-    - Tuple of (tvl_raw, tvl_interpolated)
+    - Slope as TVL change per day, or 0.0 with fewer than two distinct days
     """
-    if current_date in tvl_map:
-        raw_tvl = tvl_map[current_date]
-        return (raw_tvl, raw_tvl)
-    
-    prev_date, next_date = _find_nearest_dates(current_date, all_available_dates)
-    
-    if prev_date is not None and next_date is not None:
-        # Linear interpolation between two points
-        prev_tvl = tvl_map[prev_date]
-        next_tvl = tvl_map[next_date]
-        days_between = (next_date - prev_date).days
-        days_from_prev = (current_date - prev_date).days
-        interpolated_tvl = prev_tvl + (next_tvl - prev_tvl) * (days_from_prev / days_between)
-        return (None, interpolated_tvl)
-    
-    if not extrapolate:
-        return (None, None)
-    
-    if prev_date is not None:
-        # Forward extrapolation
-        dates_before = [d for d in all_available_dates if d <= current_date or d == prev_date]
-        if len(dates_before) >= 2:
-            date1, date2 = dates_before[-2], dates_before[-1]
-            slope = _get_extrapolation_slope(date1, tvl_map[date1], date2, tvl_map[date2])
-            days_diff = (current_date - date2).days
-            return (None, tvl_map[date2] + slope * days_diff)
-        else:
-            return (None, tvl_map[prev_date])
-    
-    if next_date is not None:
-        # Backward extrapolation
-        dates_after = [d for d in all_available_dates if d >= current_date or d == next_date]
-        if len(dates_after) >= 2:
-            date1, date2 = dates_after[0], dates_after[1]
-            slope = _get_extrapolation_slope(date1, tvl_map[date1], date2, tvl_map[date2])
-            days_diff = (current_date - date1).days
-            return (None, tvl_map[date1] + slope * days_diff)
-        else:
-            return (None, tvl_map[next_date])
-    
-    return (None, 0.0 if extrapolate else None)
+    if ords.size < 2:
+        return 0.0
+    if ords.size == 2:
+        # Branchless zero-day guard: divide by 1 instead of 0, then zero the result
+        days_between = int(ords[1] - ords[0])
+        return float(tvls[1] - tvls[0]) / (days_between + (days_between == 0)) * (days_between != 0)
+
+    x = ords - ords.mean()
+    var = float(np.dot(x, x))
+    if var == 0.0:
+        return 0.0
+    return float(np.dot(x, tvls - tvls.mean())) / var
 
 
 def _get_tvl_dataset_by_chain(
@@ -313,6 +534,7 @@ def _get_tvl_dataset_by_chain(
     start_dt: datetime.date,
     end_dt: datetime.date,
     extrapolate: bool,
+    max_gap_days: Optional[int] = None,
 ) -> list[dict[str, Any]]:
     """
     Process TVL data broken down by chain.
@@ -322,83 +544,101 @@ def _get_tvl_dataset_by_chain(
     - start_dt: Start date
     - end_dt: End date
     - extrapolate: Whether to extrapolate at edges
+    - max_gap_days: Largest gap to interpolate across, or None for no limit
     
     Returns:
     - List of dicts with per-chain columns and totals
     """
-    import re
-    
     chain_tvls = data.get("chainTvls", {})
     
     if not chain_tvls:
         raise ValueError("No chain TVL data found for protocol")
     
     # Filter to only plain chain names (exclude borrowed, staking, pool2 variants)
-    excluded_pattern = re.compile(r"(-borrowed|-staking|-pool2|^borrowed$|^staking$|^pool2$)")
-    chain_names = sorted([name for name in chain_tvls.keys() if not excluded_pattern.search(name)])
+    chain_names = sorted(
+        name
+        for name in chain_tvls
+        if name not in _EXCLUDED_CHAIN_NAMES and not _EXCLUDED_CHAIN_SUFFIX.search(name)
+    )
     
     if not chain_names:
         raise ValueError("No valid chain data found (all chains are borrowed/staking/pool2)")
     
-    # Build TVL maps for each chain
-    chain_maps: dict[str, dict[datetime.date, float]] = {}
-    all_dates_set: set[datetime.date] = set()
-    
-    for chain_name in chain_names:
-        chain_data = chain_tvls[chain_name]
-        tvl_entries = chain_data.get("tvl", [])
-        
-        chain_map = {
-            datetime.datetime.fromtimestamp(entry["date"], tz=datetime.timezone.utc).date(): entry["totalLiquidityUSD"]
-            for entry in tvl_entries
-        }
-        chain_maps[chain_name] = chain_map
-        all_dates_set.update(chain_map.keys())
-    
-    # Check if we have any data in range
-    all_dates_in_range = [d for d in all_dates_set if start_dt <= d <= end_dt]
-    if not all_dates_in_range:
-        raise ValueError(f"No TVL data available between {start_dt.isoformat()} and {end_dt.isoformat()}")
-    
-    # Build result dataset
-    result = []
-    current_date = start_dt
-    
-    while current_date <= end_dt:
-        row: dict[str, Any] = {"date": current_date.isoformat()}
-        total_raw = 0.0
-        total_interpolated = 0.0
-        has_any_raw = False
-        has_any_interpolated = False
-        
-        for chain_name in chain_names:
-            chain_map = chain_maps[chain_name]
-            all_chain_dates = sorted(chain_map.keys())
-            
-            raw_val, interp_val = _process_tvl_series(
-                chain_map, current_date, all_chain_dates, extrapolate
-            )
-            
-            row[f"{chain_name}_raw"] = raw_val
-            row[f"{chain_name}_interpolated"] = interp_val
-            
-            if raw_val is not None:
-                total_raw += raw_val
-                has_any_raw = True
-            if interp_val is not None:
-                total_interpolated += interp_val
-                has_any_interpolated = True
-        
-        row["total_raw"] = total_raw if has_any_raw else None
-        row["total_interpolated"] = total_interpolated if has_any_interpolated else None
-        
+    start_ord = start_dt.toordinal()
+    end_ord = end_dt.toordinal()
+    days = np.arange(start_ord, end_ord + 1)
+
+    # One (chains x days) matrix per column, each row filled by a vectorized series evaluation
+    raw_matrix = np.full((len(chain_names), days.size), np.nan)
+    interp_matrix = np.full((len(chain_names), days.size), np.nan)
+    int_matrix = np.zeros((len(chain_names), days.size), dtype=bool)
+    has_data_in_range = False
+
+    for i, chain_name in enumerate(chain_names):
+        tvl_entries = chain_tvls[chain_name].get("tvl", [])
+        n = len(tvl_entries)
+        if n == 0:
+            # No history at all: extrapolation treats the chain as zero
+            if extrapolate:
+                interp_matrix[i] = 0.0
+            continue
+
+        timestamps = np.fromiter((e["date"] for e in tvl_entries), dtype=np.int64, count=n)
+        values = np.fromiter(
+            (e["totalLiquidityUSD"] for e in tvl_entries), dtype=np.float64, count=n
+        )
+        is_int = np.fromiter(
+            (type(e["totalLiquidityUSD"]) is int for e in tvl_entries), dtype=bool, count=n
+        )
+        # UNIX seconds -> day ordinal; later entries for the same day win
+        xp, last_idx = np.unique((timestamps // 86400 + _EPOCH_ORD)[::-1], return_index=True)
+        fp = values[::-1][last_idx]
+        is_int = is_int[::-1][last_idx]
+
+        has_data_in_range = has_data_in_range or bool(np.any((xp >= start_ord) & (xp <= end_ord)))
+        raw_matrix[i], interp_matrix[i] = _interpolate_series(
+            xp, fp, days, extrapolate, max_gap_days
+        )
+        int_matrix[i] = _int_sourced_days(xp, is_int, days, extrapolate)
+
+    if not has_data_in_range:
+        raise ValueError(
+            f"No TVL data available between {start_dt.isoformat()} and {end_dt.isoformat()}"
+        )
+
+    # Totals skip missing chains; a day with no value for any chain stays None
+    total_raw = np.where(np.isnan(raw_matrix).all(axis=0), np.nan, np.nansum(raw_matrix, axis=0))
+    total_interpolated = np.where(
+        np.isnan(interp_matrix).all(axis=0), np.nan, np.nansum(interp_matrix, axis=0)
+    )
+
+    # Assemble rows at the API boundary only; totals are sums and stay float
+    columns: list[tuple[str, list[Optional[float]]]] = []
+    for i, chain_name in enumerate(chain_names):
+        columns.append((f"{chain_name}_raw", _nan_to_none(raw_matrix[i], int_matrix[i])))
+        columns.append(
+            (f"{chain_name}_interpolated", _nan_to_none(interp_matrix[i], int_matrix[i]))
+        )
+    columns.append(("total_raw", _nan_to_none(total_raw)))
+    columns.append(("total_interpolated", _nan_to_none(total_interpolated)))
+
+    result: list[dict[str, Any]] = []
+    for j, date_str in enumerate(_iso_dates(days)):
+        row: dict[str, Any] = {"date": date_str}
+        for key, col in columns:
+            row[key] = col[j]
         result.append(row)
-        current_date += datetime.timedelta(days=1)
-    
+
     return result
 
 
-def get_average_tvl(protocol: str, start_date: str, end_date: str, extrapolate: bool = False) -> float:
+def get_average_tvl(
+    protocol: str,
+    start_date: str,
+    end_date: str,
+    extrapolate: bool = False,
+    max_gap_days: Optional[int] = None,
+) -> float:
     """
     Fetch and average the daily TVL for a given protocol between start_date and end_date.
 
@@ -407,16 +647,70 @@ def get_average_tvl(protocol: str, start_date: str, end_date: str, extrapolate:
     - start_date (str): Start date in YYYY-MM-DD format (UTC).
     - end_date (str): End date in YYYY-MM-DD format (UTC).
     - extrapolate (bool): Whether to extrapolate values at start/end. Default: False.
+    - max_gap_days (int|None): Largest gap (in days) to interpolate across; days inside wider
+      gaps are left out of the average. Default: None (no limit).
 
     Returns:
     - The average TVL over the given period (uses tvl_interpolated values).
     """
-    # Use by_chain=False for aggregate average calculation
-    dataset = get_tvl_dataset(protocol, start_date, end_date, extrapolate, by_chain=False)
-    tvls = [row["tvl_interpolated"] for row in dataset if row["tvl_interpolated"] is not None]
-    if not tvls:
+    start_dt = datetime.date.fromisoformat(start_date)
+    end_dt = datetime.date.fromisoformat(end_date)
+
+    # Average the aggregate series in columnar form; no per-day rows are built
+    data = _fetch_protocol_tvl(protocol)
+    return _average_tvl(
+        _get_tvl_columns(protocol, data, start_dt, end_dt, extrapolate, max_gap_days)
+    )
+
+
+def get_average_tvls(
+    protocols: list[str],
+    start_date: str,
+    end_date: str,
+    extrapolate: bool = False,
+    max_gap_days: Optional[int] = None,
+) -> dict[str, float]:
+    """
+    Fetch and average the daily TVL for several protocols concurrently.
+
+    All requests share one keep-alive session and are fanned out over a thread pool,
+    so the wall-clock cost is close to the slowest single request.
+
+    Parameters:
+    - protocols (list[str]): Protocol names (as listed on DeFiLlama).
+    - start_date (str): Start date in YYYY-MM-DD format (UTC).
+    - end_date (str): End date in YYYY-MM-DD format (UTC).
+    - extrapolate (bool): Whether to extrapolate values at start/end. Default: False.
+    - max_gap_days (int|None): Largest gap (in days) to interpolate across; days inside wider
+      gaps are left out of the averages. Default: None (no limit).
+
+    Returns:
+    - Mapping of protocol name to its average TVL over the given period.
+    """
+    start_dt = datetime.date.fromisoformat(start_date)
+    end_dt = datetime.date.fromisoformat(end_date)
+
+    with requests.Session() as session:
+        session.mount("https://", HTTPAdapter(pool_maxsize=_FETCH_WORKERS))
+
+        # Cache misses download through the shared session; hits are shared with every caller
+        with ThreadPoolExecutor(max_workers=_FETCH_WORKERS) as executor:
+            payloads = list(
+                executor.map(lambda protocol: _fetch_protocol_tvl(protocol, session), protocols)
+            )
+
+    averages = {}
+    for protocol, data in zip(protocols, payloads):
+        result = _get_tvl_columns(protocol, data, start_dt, end_dt, extrapolate, max_gap_days)
+        averages[protocol] = _average_tvl(result)
+    return averages
+
+
+def _average_tvl(result: _TVLResult) -> float:
+    """Average the interpolated values of an aggregate series, ignoring missing (NaN) days."""
+    if np.isnan(result.interpolated).all():
         raise ValueError("No TVL data available for averaging")
-    return statistics.mean(tvls)
+    return float(np.nanmean(result.interpolated))
 
 
 def _output_chain_csv(dataset: list[dict[str, Any]]) -> None:
@@ -460,6 +754,17 @@ def _output_chain_csv(dataset: list[dict[str, Any]]) -> None:
         print(",".join(row_parts))
 
 
+def _positive_int(value: str) -> int:
+    """argparse type for options that take a whole number of at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Calculate TVL data for a DeFi protocol.")
     parser.add_argument(
@@ -493,18 +798,39 @@ if __name__ == "__main__":
         "broken down by chain with separate columns for each chain's raw and interpolated "
         "values, plus total columns.",
     )
+    parser.add_argument(
+        "--max-gap-days",
+        type=_positive_int,
+        default=None,
+        help="Do not interpolate across gaps between data points longer than this many days; "
+        "dates inside such gaps get None/null TVL values. By default, gaps of any length "
+        "are interpolated.",
+    )
     args = parser.parse_args()
 
     try:
         if args.mean:
             # Backward compatibility: output only the mean
-            avg_tvl = get_average_tvl(args.protocol, args.start_date, args.end_date, extrapolate=args.extrapolate)
+            avg_tvl = get_average_tvl(
+                args.protocol,
+                args.start_date,
+                args.end_date,
+                extrapolate=args.extrapolate,
+                max_gap_days=args.max_gap_days,
+            )
             print(
                 f"Average TVL for {args.protocol} from {args.start_date} to {args.end_date}: ${avg_tvl:,.2f}"
             )
         else:
             # Output full dataset
-            dataset = get_tvl_dataset(args.protocol, args.start_date, args.end_date, extrapolate=args.extrapolate, by_chain=not args.no_by_chain)
+            dataset = get_tvl_dataset(
+                args.protocol,
+                args.start_date,
+                args.end_date,
+                extrapolate=args.extrapolate,
+                by_chain=not args.no_by_chain,
+                max_gap_days=args.max_gap_days,
+            )
 
             if args.format == "json":
                 # JSON output
@@ -1,13 +1,23 @@
 import argparse
 import json
 import os
+import sys
 from pathlib import Path
 
 
+def load_contract_dirs(path):
+    # One strip per line; duplicates dropped (first occurrence kept) so no code.json is
+    # read twice
+    with open(path) as f:
+        return list(dict.fromkeys(s for s in map(str.strip, f.read().splitlines()) if s))
+
+
 def merge_code_outputs(contract_dirs):
     merged = {"contracts": [], "files": [], "max_inheritance_depth": 0}
     seen_contracts = set()
     seen_files = set()
+    # Resolved once: Path.cwd() is a getcwd() syscall
+    cwd = os.getcwd()
 
     for dir_name in contract_dirs:
         dir_path = Path(dir_name.strip().lower()).resolve()
@@ -41,14 +51,13 @@ def merge_code_outputs(contract_dirs):
 
             for fdata in data.get("files", []):
                 key = (fdata["md5"], dir_path.name)
-                rel_path = os.path.relpath(fdata["file"], Path.cwd())
                 if key not in seen_files:
                     merged["files"].append(
                         {
                             "md5": fdata["md5"],
                             "tdp": fdata["tdp"],
                             "sloc": fdata["sloc"],
-                            "source_path": rel_path,
+                            "source_path": os.path.relpath(fdata["file"], cwd),
                             "contract_address": dir_path.name,
                         }
                     )
@@ -67,11 +76,21 @@ def aggregate_by_hash(merged, contract_dirs=None):
     if contract_dirs is None:
         contract_dirs = list({f.get("contract_address", "") for f in merged.get("files", [])})
 
+    # Index files by hash and the wanted directories once, instead of rescanning every file
+    # (and re-lowercasing every directory) for each contract
+    files_by_hash = {}
+    for f in merged["files"]:
+        files_by_hash.setdefault(f["md5"], []).append(f)
+    wanted_dirs = {d.lower() for d in contract_dirs}
+    seen_refs = {}
+
     for contract in merged["contracts"]:
         file_hash = contract["md5"]
-        if file_hash not in aggregated:
-            file_entry = next((f for f in merged["files"] if f["md5"] == file_hash), {})
-            aggregated[file_hash] = {
+        hash_files = files_by_hash.get(file_hash, [])
+        entry = aggregated.get(file_hash)
+        if entry is None:
+            file_entry = hash_files[0] if hash_files else {}
+            entry = aggregated[file_hash] = {
                 "contracts": [],
                 "references": [],
                 "totals": {
@@ -82,8 +101,9 @@ def aggregate_by_hash(merged, contract_dirs=None):
                     "max_inheritance_depth": 0,
                 },
             }
+            seen_refs[file_hash] = set()
 
-        aggregated[file_hash]["contracts"].append(
+        entry["contracts"].append(
             {
                 "contract": contract["contract"],
                 "total_tcc": contract["total_tcc"],
@@ -92,12 +112,7 @@ def aggregate_by_hash(merged, contract_dirs=None):
             }
         )
 
-        matching_files = [
-            f
-            for f in merged["files"]
-            if f["md5"] == file_hash
-            and f["contract_address"].lower() in [d.lower() for d in contract_dirs]
-        ]
+        matching_files = [f for f in hash_files if f["contract_address"].lower() in wanted_dirs]
 
         for file_entry in matching_files:
             ref = {
@@ -105,20 +120,24 @@ def aggregate_by_hash(merged, contract_dirs=None):
                 "contract_address": file_entry.get("contract_address", ""),
                 "source_path": file_entry.get("source_path", ""),
             }
-            if ref not in aggregated[file_hash]["references"]:
-                aggregated[file_hash]["references"].append(ref)
+            ref_key = (ref["contract"], ref["contract_address"], ref["source_path"])
+            if ref_key not in seen_refs[file_hash]:
+                seen_refs[file_hash].add(ref_key)
+                entry["references"].append(ref)
 
-        aggregated[file_hash]["totals"]["total_tcc"] += contract["total_tcc"]
-        aggregated[file_hash]["totals"]["total_tec"] += contract["total_tec"]
-        aggregated[file_hash]["totals"]["max_inheritance_depth"] = max(
-            aggregated[file_hash]["totals"]["max_inheritance_depth"], contract["inheritance_depth"]
+        totals = entry["totals"]
+        totals["total_tcc"] += contract["total_tcc"]
+        totals["total_tec"] += contract["total_tec"]
+        totals["max_inheritance_depth"] = max(
+            totals["max_inheritance_depth"], contract["inheritance_depth"]
         )
 
     return aggregated
 
 
 def output_tsv_from_aggregated(aggregated):
-    print("Contract Names\tTCC\tTEC\tTDP\tCLOC\tMax ID\tFile Hash\tContract Addresses")
+    # Build the whole table and write it once rather than print()ing row by row
+    out = ["Contract Names\tTCC\tTEC\tTDP\tCLOC\tMax ID\tFile Hash\tContract Addresses\n"]
     for file_hash, entry in aggregated.items():
         contract_names = ",".join(sorted({c["contract"] for c in entry["contracts"]}))
         contract_addresses = ",".join(sorted({r["contract_address"] for r in entry["references"]}))
@@ -133,7 +152,8 @@ def output_tsv_from_aggregated(aggregated):
             file_hash,
             contract_addresses,
         ]
-        print("\t".join(map(str, row)))
+        out.append("\t".join(map(str, row)) + "\n")
+    sys.stdout.write("".join(out))
 
 
 if __name__ == "__main__":
@@ -142,8 +162,7 @@ if __name__ == "__main__":
     parser.add_argument("--tsv", action="store_true", help="Output summary as TSV instead of JSON")
     args = parser.parse_args()
 
-    with open(args.input) as f:
-        contract_dirs = [line.strip() for line in f if line.strip()]
+    contract_dirs = load_contract_dirs(args.input)
 
     merged_summary = merge_code_outputs(contract_dirs)
     aggregated = aggregate_by_hash(merged_summary, contract_dirs)
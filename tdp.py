@@ -1,8 +1,12 @@
 import hashlib
 import json
+import os
 import re
 import sys
 
+# File extension -> file type understood by remove_comments and calculate_tdp
+FILE_TYPES = {".sol": "sol", ".vy": "vy"}
+
 
 # Function to remove comments based on file type
 def remove_comments(lines, file_type):
@@ -70,23 +74,37 @@ def calculate_tdp(lines, file_type):
 # Exposed function to compute TDP from a file path
 def compute_tdp_from_file(filepath):
     try:
-        with open(filepath) as f:
-            lines = f.read().splitlines()
-
-        file_type = (
-            "sol" if filepath.endswith(".sol") else "vy" if filepath.endswith(".vy") else None
-        )
-        if not file_type:
-            raise ValueError(f"Unsupported file type for {filepath}")
-
-        cleaned_lines = remove_comments(lines, file_type)
-        return calculate_tdp(cleaned_lines, file_type)
+        return compute_tdp_and_hash(filepath)[0]
 
     except Exception as e:
         print(f"⚠️ Error computing TDP for {filepath}: {e}", file=sys.stderr)
         return 0
 
 
+# Exposed function to compute TDP and the uniqueness hash (sha1 of the comment-stripped
+# source) from a file path, reading and cleaning the file only once. Read, decode and
+# unsupported-type errors are raised to the caller. A batch can pass a dict as tdp_by_hash
+# to count duplicated sources once; it maps (hash, file type) to TDP
+def compute_tdp_and_hash(filepath, tdp_by_hash=None):
+    with open(filepath) as f:
+        lines = f.read().splitlines()
+
+    file_type = FILE_TYPES.get(os.path.splitext(filepath)[1])
+    if not file_type:
+        raise ValueError(f"Unsupported file type for {filepath}")
+
+    cleaned_lines = remove_comments(lines, file_type)
+    file_hash = hashlib.sha1("\n".join(cleaned_lines).encode()).hexdigest()
+    if tdp_by_hash is None:
+        return calculate_tdp(cleaned_lines, file_type), file_hash
+
+    key = (file_hash, file_type)
+    tdp = tdp_by_hash.get(key)
+    if tdp is None:
+        tdp = tdp_by_hash[key] = calculate_tdp(cleaned_lines, file_type)
+    return tdp, file_hash
+
+
 # Main script execution (for CLI use)
 if __name__ == "__main__":
     try:
@@ -94,6 +112,7 @@ if __name__ == "__main__":
         total_tdp_unique = 0
         total_tdp_all = 0
         seen_hashes = {}
+        tdp_by_hash = {}
 
         if len(sys.argv) > 1:
             for file_path in sys.argv[1:]:
@@ -101,20 +120,17 @@ if __name__ == "__main__":
                     with open(file_path) as f:
                         lines = f.read().splitlines()
 
-                    file_type = (
-                        "sol"
-                        if file_path.endswith(".sol")
-                        else "vy"
-                        if file_path.endswith(".vy")
-                        else None
-                    )
+                    file_type = FILE_TYPES.get(os.path.splitext(file_path)[1])
                     if not file_type:
                         file_results[file_path] = "Error: Unsupported file type"
                         continue
 
                     cleaned_lines = remove_comments(lines, file_type)
-                    file_hash = hashlib.md5("\n".join(cleaned_lines).encode()).hexdigest()
-                    tdp = calculate_tdp(cleaned_lines, file_type)
+                    file_hash = hashlib.sha1("\n".join(cleaned_lines).encode()).hexdigest()
+                    key = (file_hash, file_type)
+                    tdp = tdp_by_hash.get(key)
+                    if tdp is None:
+                        tdp = tdp_by_hash[key] = calculate_tdp(cleaned_lines, file_type)
                     file_results[file_path] = tdp
                     total_tdp_all += tdp
 
@@ -0,0 +1,152 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path to import trr and tdp (once, even if this module is re-imported)
+_TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+if _TEST_DIR not in sys.path:
+    sys.path.insert(0, _TEST_DIR)
+
+import trr  # noqa: E402
+from trr import _print_json, _tdp_worker  # noqa: E402
+
+
+class TestTDPWorker(unittest.TestCase):
+    """Test the per-file scoring used by the tdp command"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self._tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_scores_solidity_file(self):
+        """Test that a readable file returns its TDP and a hash"""
+        path = self._write("a.sol", b"if (x) {\n  require(y);\n}\n")
+
+        tdp, file_hash = _tdp_worker(path)
+
+        self.assertEqual(tdp, 2)
+        self.assertIsNotNone(file_hash)
+
+    def test_undecodable_file_reports_error(self):
+        """Test that a file that is not valid UTF-8 is reported, not scored as 0"""
+        path = self._write("bad.sol", b"if (x) { \xff\xfe }\n")
+
+        tdp, file_hash = _tdp_worker(path)
+
+        self.assertIsInstance(tdp, str)
+        self.assertTrue(tdp.startswith("Error: "), tdp)
+        self.assertIsNone(file_hash)
+
+    def test_missing_file(self):
+        """Test that a path that does not exist is reported as not found"""
+        path = os.path.join(self._tmp.name, "missing.sol")
+
+        self.assertEqual(_tdp_worker(path), ("Error: File not found", None))
+
+    def test_unsupported_file_type(self):
+        """Test that an unknown extension is rejected before the file is read"""
+        path = self._write("notes.txt", b"if (x) {}\n")
+
+        self.assertEqual(_tdp_worker(path), ("Error: Unsupported file type", None))
+
+    def test_unreadable_path_reports_error(self):
+        """Test that a read failure past the guards (a directory) becomes an error entry"""
+        path = os.path.join(self._tmp.name, "dir.sol")
+        os.mkdir(path)
+
+        tdp, file_hash = _tdp_worker(path)
+
+        self.assertTrue(tdp.startswith("Error: "), tdp)
+        self.assertIsNone(file_hash)
+
+    def test_batch_memo_counts_duplicates_once(self):
+        """Test that a shared memo skips re-counting a source already seen in the batch"""
+        import tdp
+
+        first = self._write("a.sol", b"// copy one\nif (x) {}\n")
+        second = self._write("b.sol", b"// copy two\nif (x) {}\n")
+        tdp_by_hash = {}
+
+        with mock.patch.object(tdp, "calculate_tdp", wraps=tdp.calculate_tdp) as calc:
+            results = [_tdp_worker(path, tdp_by_hash) for path in (first, second)]
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(calc.call_count, 1)
+        self.assertEqual(len(tdp_by_hash), 1)
+
+    def test_pool_worker_uses_its_own_memo(self):
+        """Test that after the pool initializer runs, a worker memoizes without a passed memo"""
+        import tdp
+
+        self.addCleanup(setattr, trr, "_worker_tdp_by_hash", None)
+        trr._init_tdp_worker()
+        first = self._write("a.sol", b"// copy one\nif (x) {}\n")
+        second = self._write("b.sol", b"// copy two\nif (x) {}\n")
+
+        with mock.patch.object(tdp, "calculate_tdp", wraps=tdp.calculate_tdp) as calc:
+            results = [_tdp_worker(path) for path in (first, second)]
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(calc.call_count, 1)
+        self.assertEqual(len(trr._worker_tdp_by_hash), 1)
+
+    def test_main_totals_on_pool_path(self):
+        """Test the tdp totals for a batch large enough to be scored in a process pool"""
+        files = []
+        for i in range(trr._TDP_POOL_MIN_FILES):
+            # Every fourth file repeats one source (with different comments)
+            body = "if (x) {}\n" if i % 4 == 0 else "if (x) {}\n" * (i + 1)
+            files.append(self._write(f"c{i}.sol", f"// file {i}\n{body}".encode()))
+        unique = sum(i + 1 for i in range(len(files)) if i % 4) + 1
+        total = sum(1 if i % 4 == 0 else i + 1 for i in range(len(files)))
+        out = io.StringIO()
+
+        with mock.patch.object(sys, "argv", ["trr", "tdp", *files]):
+            with contextlib.redirect_stdout(out):
+                trr.main()
+
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["Total (Unique)"], unique)
+        self.assertEqual(result["Total (All)"], total)
+        self.assertEqual(len(result), len(files) + 2)
+
+
+class TestPrintJSON(unittest.TestCase):
+    """Test the JSON printer shared by the summary and tvl commands"""
+
+    OBJ = {"name": "\u00dcn\u00ef", "tvl": 1e-05, "rows": [1, 2]}
+
+    def test_text_stream_without_buffer(self):
+        """Test that a stdout with no byte buffer gets the json.dumps text unchanged"""
+        out = io.StringIO()
+
+        with contextlib.redirect_stdout(out):
+            _print_json(self.OBJ)
+
+        self.assertEqual(out.getvalue(), json.dumps(self.OBJ, indent=2) + "\n")
+
+    def test_byte_stream_round_trips(self):
+        """Test that output written through stdout's byte buffer parses back to the object"""
+        raw = io.BytesIO()
+        out = io.TextIOWrapper(raw, encoding="utf-8")
+
+        with contextlib.redirect_stdout(out):
+            _print_json(self.OBJ)
+        out.flush()
+
+        self.assertEqual(json.loads(raw.getvalue().decode("utf-8")), self.OBJ)
+
+
+if __name__ == "__main__":
+    unittest.main()
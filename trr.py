@@ -9,33 +9,79 @@ import os
 import sys
 from pathlib import Path
 
-from dotenv import load_dotenv
+# Below this many files the process pool costs more to start than it saves
+_TDP_POOL_MIN_FILES = 32
 
-# Load environment variables from .env file
-load_dotenv()
 
+# Per-process memo of TDP by (hash, file type), set up by _init_tdp_worker in each pool
+# worker; it lives as long as the pool, so one tdp batch
+_worker_tdp_by_hash = None
 
-def main():
-    parser = argparse.ArgumentParser(
-        prog="trr",
-        description="TRR Scripts - Smart contract analysis toolkit",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  trr download eth contracts.txt
-  trr analyze contracts.txt
-  trr summary contracts.txt --tsv
-  trr tvl dolomite 2022-12-18 2025-02-28 --format csv
-  trr deployments eth contracts.txt
-  trr scan --strict-interactions
-  trr compare file1.json file2.json --verbose
-  trr tdp contract1.sol contract2.sol
-        """,
-    )
 
-    subparsers = parser.add_subparsers(dest="command", help="Available commands", metavar="COMMAND")
+def _init_tdp_worker():
+    """Give a tdp pool worker a fresh memo for the batch."""
+    global _worker_tdp_by_hash
+    _worker_tdp_by_hash = {}
+
+
+def _tdp_worker(file_path, tdp_by_hash=None):
+    """
+    Score one file for the tdp command; runs in a worker process.
+
+    tdp_by_hash, if given, is the batch's memo of TDP by (hash, file type), so duplicated
+    sources are only counted once; pool workers fall back to their own per-process memo.
 
-    # Download command
+    Returns (tdp, file_hash): tdp is an int or an "Error: ..." string, and file_hash is the
+    sha1 of the comment-stripped source, or None if the file could not be scored.
+    """
+    from tdp import FILE_TYPES, compute_tdp_and_hash
+
+    # Expected failures are plain checks; only the read and scoring of the file itself can
+    # raise, and those errors are reported per file
+    if not os.path.exists(file_path):
+        return "Error: File not found", None
+    if os.path.splitext(file_path)[1] not in FILE_TYPES:
+        return "Error: Unsupported file type", None
+
+    if tdp_by_hash is None:
+        tdp_by_hash = _worker_tdp_by_hash
+    try:
+        return compute_tdp_and_hash(file_path, tdp_by_hash)
+    except Exception as e:
+        return f"Error: {e}", None
+
+
+def _print_json(obj):
+    """
+    Print obj as JSON indented by 2 spaces, encoding with orjson when it is installed.
+
+    orjson's output parses to the same data but is not byte-identical to json.dumps: it writes
+    non-ASCII characters as raw UTF-8 instead of \\u escapes, and may spell floats differently
+    (0.00001 rather than 1e-05). Streams without a byte buffer (captured or replaced stdout)
+    always get the json.dumps text.
+    """
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    if orjson is not None and hasattr(sys.stdout, "buffer"):
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            pass  # e.g. non-str keys; the stdlib encoder handles those
+        else:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(data + b"\n")
+            return
+
+    import json
+
+    print(json.dumps(obj, indent=2))
+
+
+def _add_download_parser(subparsers):
+    """Register the download command"""
     download_parser = subparsers.add_parser(
         "download",
         help="Download contracts from Etherscan/Arbiscan",
@@ -48,7 +94,9 @@ Examples:
         "addresses_file", help="File containing contract addresses (one per line)"
     )
 
-    # Analyze command
+
+def _add_analyze_parser(subparsers):
+    """Register the analyze command"""
     analyze_parser = subparsers.add_parser(
         "analyze",
         help="Analyze contracts using Slither",
@@ -58,7 +106,9 @@ Examples:
         "addresses_file", help="File containing contract addresses (one per line)"
     )
 
-    # Summary command
+
+def _add_summary_parser(subparsers):
+    """Register the summary command"""
     summary_parser = subparsers.add_parser(
         "summary",
         help="Aggregate and summarize contract metrics",
@@ -71,7 +121,9 @@ Examples:
         "--tsv", action="store_true", help="Output summary as TSV instead of JSON"
     )
 
-    # TVL command
+
+def _add_tvl_parser(subparsers):
+    """Register the tvl command"""
     tvl_parser = subparsers.add_parser(
         "tvl",
         help="Calculate TVL data for DeFi protocols",
@@ -87,7 +139,9 @@ Examples:
         "--mean", action="store_true", help="Output only the average TVL (backward compatibility)"
     )
 
-    # Deployments command
+
+def _add_deployments_parser(subparsers):
+    """Register the deployments command"""
     deployments_parser = subparsers.add_parser(
         "deployments",
         help="Fetch contract deployment dates",
@@ -100,7 +154,9 @@ Examples:
         "addresses_file", help="File containing contract addresses (one per line)"
     )
 
-    # Scan command
+
+def _add_scan_parser(subparsers):
+    """Register the scan command"""
     scan_parser = subparsers.add_parser(
         "scan",
         help="Contract discovery and relationship mapping",
@@ -115,7 +171,9 @@ Examples:
         help="Enable strict trace-based interaction filtering",
     )
 
-    # Compare command
+
+def _add_compare_parser(subparsers):
+    """Register the compare command"""
     compare_parser = subparsers.add_parser(
         "compare",
         help="Compare contract discovery results",
@@ -126,7 +184,9 @@ Examples:
     compare_parser.add_argument("--verbose", action="store_true", help="Show sample addresses")
     compare_parser.add_argument("--output", action="store_true", help="Save full diff files")
 
-    # TDP command
+
+def _add_tdp_parser(subparsers):
+    """Register the tdp command"""
     tdp_parser = subparsers.add_parser(
         "tdp",
         help="Calculate Total Decision Points",
@@ -134,11 +194,59 @@ Examples:
     )
     tdp_parser.add_argument("files", nargs="+", help="Solidity or Vyper files to analyze")
 
+
+_COMMAND_PARSERS = {
+    "download": _add_download_parser,
+    "analyze": _add_analyze_parser,
+    "summary": _add_summary_parser,
+    "tvl": _add_tvl_parser,
+    "deployments": _add_deployments_parser,
+    "scan": _add_scan_parser,
+    "compare": _add_compare_parser,
+    "tdp": _add_tdp_parser,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="trr",
+        description="TRR Scripts - Smart contract analysis toolkit",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  trr download eth contracts.txt
+  trr analyze contracts.txt
+  trr summary contracts.txt --tsv
+  trr tvl dolomite 2022-12-18 2025-02-28 --format csv
+  trr deployments eth contracts.txt
+  trr scan --strict-interactions
+  trr compare file1.json file2.json --verbose
+  trr tdp contract1.sol contract2.sol
+        """,
+    )
+
+    subparsers = parser.add_subparsers(dest="command", help="Available commands", metavar="COMMAND")
+
+    # Only build the subparser for the command being run; --help and a missing or unknown
+    # command fall back to all of them so the usage listing is complete
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command in _COMMAND_PARSERS:
+        _COMMAND_PARSERS[command](subparsers)
+    else:
+        for add_parser in _COMMAND_PARSERS.values():
+            add_parser(subparsers)
+
     args = parser.parse_args()
 
     if not args.command:
         parser.print_help()
-        sys.exit(1)  # noqa: F823
+        sys.exit(1)
+
+    # Load environment variables from .env file only once a command will actually run,
+    # so --help and usage errors skip it
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
     # Route to appropriate command handler with lazy imports
     try:
@@ -156,12 +264,14 @@ Examples:
             analyze_main(args.addresses_file)
 
         elif args.command == "summary":
-            import json
-
-            from summary import aggregate_by_hash, merge_code_outputs, output_tsv_from_aggregated
+            from summary import (
+                aggregate_by_hash,
+                load_contract_dirs,
+                merge_code_outputs,
+                output_tsv_from_aggregated,
+            )
 
-            with open(args.addresses_file) as f:
-                contract_dirs = [line.strip() for line in f if line.strip()]
+            contract_dirs = load_contract_dirs(args.addresses_file)
 
             merged_summary = merge_code_outputs(contract_dirs)
             aggregated = aggregate_by_hash(merged_summary, contract_dirs)
@@ -169,11 +279,9 @@ Examples:
             if args.tsv:
                 output_tsv_from_aggregated(aggregated)
             else:
-                print(json.dumps(aggregated, indent=2))
+                _print_json(aggregated)
 
         elif args.command == "tvl":
-            import json
-
             from avg_tvls import get_average_tvl, get_tvl_dataset
 
             if args.mean:
@@ -185,19 +293,22 @@ Examples:
                 dataset = get_tvl_dataset(args.protocol, args.start_date, args.end_date)
 
                 if args.format == "json":
-                    output = json.dumps(dataset, indent=2)
-                    print(output)
+                    _print_json(dataset)
                 else:
-                    print("date,tvl,is_interpolated")
-                    for row in dataset:
-                        print(
-                            f"{row['date']},{row['tvl']:.2f},{str(row['is_interpolated']).lower()}"
-                        )
+                    import csv
+
+                    # Columns follow the dataset's keys: date, per-chain raw/interpolated, totals
+                    columns = list(dataset[0])
+                    writer = csv.writer(sys.stdout, lineterminator="\n")
+                    writer.writerow(columns)
+                    writer.writerows(
+                        [row["date"]]
+                        + ["" if row[col] is None else f"{row[col]:.2f}" for col in columns[1:]]
+                        for row in dataset
+                    )
 
         elif args.command == "deployments":
-            # Call the bash script or implement Python version
-            import subprocess
-
+            # Replace this process with the bash script; its exit status becomes ours
             script_path = Path(__file__).parent / "deployment_dates.sh"
 
             if not script_path.exists():
@@ -207,10 +318,9 @@ Examples:
             # Make sure script is executable
             os.chmod(script_path, 0o755)
 
-            result = subprocess.run(
-                [str(script_path), args.network, args.addresses_file], check=False
-            )
-            sys.exit(result.returncode)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.execv(str(script_path), [str(script_path), args.network, args.addresses_file])
 
         elif args.command == "scan":
             # Change to scanner directory for scanner.py to work correctly
@@ -220,8 +330,6 @@ Examples:
                 sys.exit(1)
 
             # Import and run scanner
-            import sys
-
             original_argv = sys.argv.copy()
             sys.argv = ["scanner.py"]
             if args.previous:
@@ -233,17 +341,26 @@ Examples:
             original_cwd = os.getcwd()
             os.chdir(scanner_path.parent)
 
+            # Regular import (bytecode cached). With the scanner directory first on sys.path,
+            # "scanner" resolves to scanner.py rather than the package, and scanner.py's
+            # top-level imports of its sibling modules resolve too
+            scanner_dir = str(scanner_path.parent)
+            original_scanner_module = sys.modules.pop("scanner", None)
+            sys.path.insert(0, scanner_dir)
+
             try:
-                # Import and run
-                import importlib.util
+                import scanner as scanner_module
 
-                spec = importlib.util.spec_from_file_location("scanner", scanner_path)
-                scanner_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(scanner_module)
                 scanner_module.main()
             finally:
                 os.chdir(original_cwd)
                 sys.argv = original_argv
+                # Undo the import setup so later imports of "scanner" get the package again
+                sys.path.remove(scanner_dir)
+                if original_scanner_module is not None:
+                    sys.modules["scanner"] = original_scanner_module
+                else:
+                    sys.modules.pop("scanner", None)
 
         elif args.command == "compare":
             from scanner.compare_contracts import compare_contract_files
@@ -254,47 +371,35 @@ Examples:
 
         elif args.command == "tdp":
             import json
-
-            from tdp import compute_tdp_from_file
+            from concurrent.futures import ProcessPoolExecutor
 
             file_results = {}
             total_tdp_unique = 0
             total_tdp_all = 0
             seen_hashes = {}
-            import hashlib
-
-            for file_path in args.files:
-                try:
-                    file_path_obj = Path(file_path)
-                    if not file_path_obj.exists():
-                        file_results[file_path] = "Error: File not found"
-                        continue
-
-                    tdp = compute_tdp_from_file(str(file_path_obj))
-                    file_results[file_path] = tdp
-                    total_tdp_all += tdp
-
-                    # Calculate hash for uniqueness check
-                    with open(file_path_obj) as f:
-                        lines = f.read().splitlines()
-                    from tdp import remove_comments
-
-                    file_type = (
-                        "sol"
-                        if file_path.endswith(".sol")
-                        else "vy"
-                        if file_path.endswith(".vy")
-                        else None
-                    )
-                    if file_type:
-                        cleaned_lines = remove_comments(lines, file_type)
-                        file_hash = hashlib.md5("\n".join(cleaned_lines).encode()).hexdigest()
-                        if file_hash not in seen_hashes:
-                            seen_hashes[file_hash] = tdp
-                            total_tdp_unique += tdp
-
-                except Exception as e:
-                    file_results[file_path] = f"Error: {e}"
+
+            # Files are independent and CPU-bound, so score them across processes
+            if len(args.files) >= _TDP_POOL_MIN_FILES:
+                workers = os.cpu_count() or 1
+                chunksize = max(1, len(args.files) // (workers * 4))
+                # Each worker memoizes the duplicates it sees; the memo ends with the pool
+                with ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_tdp_worker
+                ) as executor:
+                    results = list(executor.map(_tdp_worker, args.files, chunksize=chunksize))
+            else:
+                # Memo lives for this batch only
+                tdp_by_hash = {}
+                results = [_tdp_worker(file_path, tdp_by_hash) for file_path in args.files]
+
+            for file_path, (tdp, file_hash) in zip(args.files, results):
+                file_results[file_path] = tdp
+                if isinstance(tdp, str):
+                    continue
+                total_tdp_all += tdp
+                if file_hash is not None and file_hash not in seen_hashes:
+                    seen_hashes[file_hash] = tdp
+                    total_tdp_unique += tdp
 
             file_results["Total (Unique)"] = total_tdp_unique
             file_results["Total (All)"] = total_tdp_all